@@ -309,10 +309,11 @@ def _VisitNode(node, visitor, *args, **kwargs):
   if node_class_name not in visitor.visit_class_names:
     return node
 
-  if node_class_name in visitor.enter_functions:
+  enter = visitor.enter_dispatch.get(node_class_name)
+  if enter is not None:
     # The visitor wants to be informed that we're descending into this part
     # of the tree.
-    status = visitor.Enter(node, *args, **kwargs)
+    status = enter(visitor, node, *args, **kwargs)
     # Don't descend if Enter<Node> explicitly returns False, but not None,
     # since None is the default return of Python functions.
     if status is False:  # pylint: disable=g-bool-id-comparison
@@ -339,11 +340,14 @@ def _VisitNode(node, visitor, *args, **kwargs):
 
   visitor.old_node = node
   # Now call the user supplied callback(s), if they exist.
-  if (visitor.visits_all_node_types or
-      node_class_name in visitor.visit_functions):
+  visit = visitor.visit_dispatch.get(node_class_name)
+  if visit is not None:
+    new_node = visit(visitor, new_node, *args, **kwargs)
+  elif visitor.visits_all_node_types:
     new_node = visitor.Visit(new_node, *args, **kwargs)
-  if node_class_name in visitor.leave_functions:
-    visitor.Leave(node, *args, **kwargs)
+  leave = visitor.leave_dispatch.get(node_class_name)
+  if leave is not None:
+    leave(visitor, node, *args, **kwargs)
 
   del visitor.old_node
   return new_node
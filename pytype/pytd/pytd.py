@@ -25,6 +25,7 @@ import itertools
 
 from pytype.pytd.parse import node
 from pytype.pytd.parse import preconditions
+import six
 
 
 # This mixin is used to define the classes that satisfy the {Type}
@@ -376,14 +377,23 @@ class ClassType(node.Node('name: str'), Type):
   #     to classes that are back at the top of the tree, that would generate
   #     cycles.
 
-  def __getnewargs__(self):
-    # Due to a peculiarity of cPickle, the new args cannot have references back
-    # into the tree, so we only set name (a string) as a newarg, and set
-    # cls to its actual value through getstate/setstate.
-    return self.name, None
-
-  def __getstate__(self):
-    return (self.cls,)
+  def __reduce__(self):
+    # Due to a peculiarity of cPickle, the constructor args cannot have
+    # references back into the tree, so we only pass name (a string) to the
+    # constructor, and set cls to its actual value through setstate.
+    # The same class is usually referenced many times. Interning the name lets
+    # the pickler's memo write it only once, and lets all unpickled ClassTypes
+    # of the same class share the string. (Python 2 can only intern str, not
+    # unicode.)
+    name = self.name
+    if isinstance(name, str):
+      name = six.moves.intern(name)
+    # Pickled ASTs usually have their .cls pointers cleared (see
+    # serialize_ast.StoreAst). The constructor sets cls to None, so these
+    # nodes need no state.
+    if self.cls is None:
+      return self.__class__, (name,)
+    return self.__class__, (name,), (self.cls,)
 
   def __setstate__(self, state):
     self.cls = state[0]
@@ -30,6 +30,25 @@ class TestPytd(unittest.TestCase):
     self.assertEqual(f.name, unpickled_f.name)
     self.assertEqual(f.function, unpickled_f.function)
 
+  def testClassTypePickle(self):
+    cls = pytd.Class("foo.A", None, (), (), (), (), None, ())
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+      for name in ("foo.A", u"foo.A"):
+        for cls_ptr in (cls, None):
+          t = pytd.ClassType(name, cls_ptr)
+          unpickled_t = cPickle.loads(cPickle.dumps(t, protocol))
+          self.assertEqual(t.name, unpickled_t.name)
+          self.assertEqual(t.cls, unpickled_t.cls)
+
+  def testClassTypePickleSharesNames(self):
+    # Build the names at runtime, so they are distinct string objects.
+    a = pytd.ClassType(".".join(["foo", "A"]))
+    b = pytd.ClassType(".".join(["foo", "A"]))
+    self.assertIsNot(a.name, b.name)
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+      unpickled_a, unpickled_b = cPickle.loads(cPickle.dumps([a, b], protocol))
+      self.assertIs(unpickled_a.name, unpickled_b.name)
+
   def testUnionTypeEq(self):
     u1 = pytd.UnionType((self.int, self.float))
     u2 = pytd.UnionType((self.float, self.int))
@@ -40,6 +40,9 @@ from six.moves import cPickle
 
 _PICKLE_PROTOCOL = cPickle.HIGHEST_PROTOCOL
 _PICKLE_RECURSION_LIMIT_AST = 40000
+# Write buffer for pickle files. Pickled ASTs of large modules are several MB,
+# so a bigger buffer saves a lot of small writes.
+_PICKLE_BUFFER_SIZE = 1 << 20
 
 
 ANON_PARAM = re.compile(r"_[0-9]+")
@@ -467,7 +470,7 @@ def SavePickle(data, filename=None, compress=False):
           # TODO(b/117797409): Remove disable once typeshed bug is fixed.
           cPickle.dump(data, zfi, _PICKLE_PROTOCOL)  # pytype: disable=wrong-arg-types
     elif filename is not None:
-      with open(filename, "wb") as fi:
+      with open(filename, "wb", _PICKLE_BUFFER_SIZE) as fi:
         cPickle.dump(data, fi, _PICKLE_PROTOCOL)
     else:
       return cPickle.dumps(data, _PICKLE_PROTOCOL)
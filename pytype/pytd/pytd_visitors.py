@@ -23,6 +23,7 @@ like to use, feel free to propose moving it here.
 
 import collections
 import logging
+import re
 
 from pytype.pytd import pytd
 from pytype.pytd.parse import parser_constants
@@ -108,6 +109,11 @@ class Visitor(object):
       corresponding Visit functions.
     leave_functions: A dictionary mapping node class names to the
       corresponding Leave functions.
+    enter_dispatch, visit_dispatch, leave_dispatch: Like enter_functions,
+      visit_functions and leave_functions, but mapping to the functions the
+      tree walker calls directly, with the visitor as first argument. These are
+      the Enter<Name>/Visit<Name>/Leave<Name> functions, unless the visitor
+      overrides Enter/Visit/Leave, in which case they are the overrides.
     visit_class_names: A set of node class names that must be visited.  This is
       constructed based on the enter/visit/leave functions and precondition
       data about legal ASTs.  As an optimization, the visitor will only visit
@@ -124,8 +130,9 @@ class Visitor(object):
     # The set of method names for each visitor implementation is assumed to
     # be fixed. Therefore this introspection can be cached.
     if cls in Visitor._visitor_functions_cache:
-      enter_fns, visit_fns, leave_fns, visit_class_names = (
-          Visitor._visitor_functions_cache[cls])
+      (enter_fns, visit_fns, leave_fns, visit_class_names,
+       enter_dispatch, visit_dispatch, leave_dispatch) = (
+           Visitor._visitor_functions_cache[cls])
     else:
       enter_fns = {}
       enter_prefix = "Enter"
@@ -167,13 +174,26 @@ class Visitor(object):
           visit_all = True
       if visit_all:
         visit_class_names = ALL_NODE_NAMES
+
+      # Let the tree walker skip the Enter/Visit/Leave indirection, unless
+      # these have been overridden.
+      def Dispatch(fns, method, base_method):
+        return fns if method == base_method else dict.fromkeys(fns, method)
+      enter_dispatch = Dispatch(enter_fns, cls.Enter, Visitor.Enter)
+      visit_dispatch = Dispatch(visit_fns, cls.Visit, Visitor.Visit)
+      leave_dispatch = Dispatch(leave_fns, cls.Leave, Visitor.Leave)
+
       Visitor._visitor_functions_cache[cls] = (
-          enter_fns, visit_fns, leave_fns, visit_class_names)
+          enter_fns, visit_fns, leave_fns, visit_class_names,
+          enter_dispatch, visit_dispatch, leave_dispatch)
 
     self.enter_functions = enter_fns
     self.visit_functions = visit_fns
     self.leave_functions = leave_fns
     self.visit_class_names = visit_class_names
+    self.enter_dispatch = enter_dispatch
+    self.visit_dispatch = visit_dispatch
+    self.leave_dispatch = leave_dispatch
 
   def Enter(self, node, *args, **kwargs):
     return self.enter_functions[node.__class__.__name__](
@@ -796,8 +816,14 @@ class RenameModuleVisitor(Visitor):
     assert not old_module_name.endswith(".")
     assert not new_module_name.endswith(".")
     self._module_name = new_module_name
-    self._old = old_module_name + "." if old_module_name else ""
+    # Matches names local to the old module and captures the unqualified part.
+    self._old_re = re.compile(r"\A%s\.([^.]*)\Z" % re.escape(old_module_name))
     self._new = new_module_name + "." if new_module_name else ""
+    # Maps names to their renamed versions. The same names (e.g. the type of
+    # many parameters) show up over and over again in an AST.
+    self._name_cache = {}
+    # Renamed ClassType nodes, keyed by new name and id of the class pointer.
+    self._class_type_cache = {}
 
   def _MaybeNewName(self, name):
     """Decides if a name should be replaced.
@@ -812,23 +838,34 @@ class RenameModuleVisitor(Visitor):
     """
     if not name:
       return name
-    before, match, after = name.partition(self._old)
-    if match and not before and "." not in after:
-      return self._new + after
-    else:
-      return name
+    try:
+      return self._name_cache[name]
+    except KeyError:
+      pass
+    match = self._old_re.match(name)
+    new_name = self._new + match.group(1) if match else name
+    self._name_cache[name] = new_name
+    return new_name
 
   def _ReplaceModuleName(self, node):
-    new_name = self._MaybeNewName(node.name)
+    # Inline the cache hit to save a method call on every visited node.
+    new_name = (self._name_cache.get(node.name) or
+                self._MaybeNewName(node.name))
     if new_name != node.name:
       return node.Replace(name=new_name)
     else:
       return node
 
   def VisitClassType(self, node):
-    new_name = self._MaybeNewName(node.name)
+    new_name = (self._name_cache.get(node.name) or
+                self._MaybeNewName(node.name))
     if new_name != node.name:
-      return pytd.ClassType(new_name, node.cls)
+      key = (new_name, id(node.cls))
+      new_node = self._class_type_cache.get(key)
+      if new_node is None:
+        new_node = self._class_type_cache[key] = pytd.ClassType(
+            new_name, node.cls)
+      return new_node
     else:
       return node
 
@@ -69,6 +69,21 @@ class PytdVisitorsTest(parser_test_base.ParserTest):
     _, param2 = signature.params
     self.assertEqual(param2.type.scope, "other.name.SomeClass")
 
+  def testRenameModuleSharesClassTypes(self):
+    src = """
+      class SomeClass(object):
+        def f(self, x: SomeClass, y: SomeClass) -> SomeClass: ...
+    """
+    ast = self.Parse(src, name="foo.bar")
+    ast = ast.Visit(visitors.NamedTypeToClassType())
+    new_ast = ast.Visit(pytd_visitors.RenameModuleVisitor("foo.bar",
+                                                          "other.name"))
+
+    signature, = new_ast.Lookup("other.name.SomeClass").Lookup("f").signatures
+    _, x, y = signature.params
+    self.assertEqual(x.type.name, "other.name.SomeClass")
+    self.assertIs(x.type, y.type)
+
   def testCanonicalOrderingVisitor(self):
     src1 = """
       from typing import TypeVar
@@ -6,6 +6,7 @@ disk, which is faster to digest than a pyi file.
 """
 
 import collections
+import operator
 
 from pytype import utils
 from pytype.pyi import parser
@@ -14,6 +15,16 @@ from pytype.pytd import pytd_utils
 from pytype.pytd import visitors
 
 
+# Maximum number of entries in _parse_cache.
+_PARSE_CACHE_SIZE = 64
+
+# The most recently used parsed ASTs for PrepareForExport, keyed by
+# (src, module_name, python_version), least recently used first. Note that each
+# key holds the full printed source of the module. The parser only produces
+# immutable nodes, so the ASTs can be shared.
+_parse_cache = collections.OrderedDict()
+
+
 class UnrestorableDependencyError(Exception):
   """If a dependency can't be restored in the current state."""
 
@@ -33,12 +44,57 @@ class FindClassAndFunctionTypesVisitor(visitors.Visitor):
     self.function_type_nodes.append(n)
 
 
-SerializableTupleClass = collections.namedtuple(
-    "_", ["ast", "dependencies", "late_dependencies",
-          "class_type_nodes", "function_type_nodes"])
+class _StorePrepVisitor(visitors.CollectDependencies):
+  """Prepares an AST for pickling in a single pass.
+
+  Collects the dependencies, clears the .cls pointers of all ClassType nodes and
+  records all ClassType and FunctionType nodes. This does the work of
+  CollectDependencies, ClearClassPointers and FindClassAndFunctionTypesVisitor
+  in one traversal. It also records whether any name in the AST is prefixed
+  with the module name, i.e. whether renaming the module needs to touch more
+  than the TypeDeclUnit itself.
+  """
+
+  def __init__(self):
+    super(_StorePrepVisitor, self).__init__()
+    self.class_type_nodes = []
+    self.function_type_nodes = []
+    self.has_self_refs = False
+    self._prefix = None
+
+  def _CheckSelfRef(self, name):
+    if name and name.startswith(self._prefix):
+      self.has_self_refs = True
+
+  def EnterTypeDeclUnit(self, n):
+    self._prefix = n.name + "."
+    # Top-level definitions are always qualified with the module name, so only
+    # modules without any need their names checked one by one.
+    if n.constants or n.classes or n.functions or n.aliases:
+      self.has_self_refs = True
+
+  def EnterClassType(self, n):
+    super(_StorePrepVisitor, self).EnterClassType(n)
+    if not self.has_self_refs:
+      self._CheckSelfRef(n.name)
+    n.cls = None
+    self.class_type_nodes.append(n)
+
+  def EnterNamedType(self, n):
+    super(_StorePrepVisitor, self).EnterNamedType(n)
+    if not self.has_self_refs:
+      self._CheckSelfRef(n.name)
+
+  def EnterTypeParameter(self, n):
+    if not self.has_self_refs:
+      self._CheckSelfRef(n.scope)
 
+  def EnterFunctionType(self, n):
+    super(_StorePrepVisitor, self).EnterFunctionType(n)
+    self.function_type_nodes.append(n)
 
-class SerializableAst(SerializableTupleClass):
+
+class SerializableAst(object):
   """The data pickled to disk to save an ast.
 
   Attributes:
@@ -54,8 +110,36 @@ class SerializableAst(SerializableTupleClass):
       visited and have their .cls set. If this attribute is None the whole AST
       will be visited and all found ClassType instances will have their .cls
       set.
+    has_self_refs: Whether any name in ast is prefixed with the module name. If
+      this is False, renaming the module only needs to rename ast itself.
   """
-  Replace = SerializableTupleClass._replace  # pylint: disable=no-member,invalid-name
+
+  __slots__ = ("ast", "dependencies", "late_dependencies",
+               "class_type_nodes", "function_type_nodes", "has_self_refs")
+
+  def __init__(self, ast, dependencies, late_dependencies,
+               class_type_nodes, function_type_nodes, has_self_refs):
+    self.ast = ast
+    self.dependencies = dependencies
+    self.late_dependencies = late_dependencies
+    self.class_type_nodes = class_type_nodes
+    self.function_type_nodes = function_type_nodes
+    self.has_self_refs = has_self_refs
+
+  def Replace(self, **kwargs):
+    """Returns a copy of this SerializableAst with some attributes replaced."""
+    g = kwargs.get
+    return SerializableAst(
+        g("ast", self.ast),
+        g("dependencies", self.dependencies),
+        g("late_dependencies", self.late_dependencies),
+        g("class_type_nodes", self.class_type_nodes),
+        g("function_type_nodes", self.function_type_nodes),
+        g("has_self_refs", self.has_self_refs))
+
+  def __reduce__(self):
+    return (SerializableAst,
+            tuple(getattr(self, name) for name in self.__slots__))
 
 
 def StoreAst(ast, filename=None):
@@ -72,22 +156,23 @@ def StoreAst(ast, filename=None):
   if ast.name.endswith(".__init__"):
     ast = ast.Visit(visitors.RenameModuleVisitor(
         ast.name, ast.name.rsplit(".__init__", 1)[0]))
-  # Collect dependencies
-  deps = visitors.CollectDependencies()
-  ast.Visit(deps)
-  dependencies = deps.dependencies
-  late_dependencies = deps.late_dependencies
-
-  # Clean external references
-  ast.Visit(visitors.ClearClassPointers())
-  indexer = FindClassAndFunctionTypesVisitor()
+  # Collect dependencies, clean external references and index the nodes.
+  indexer = _StorePrepVisitor()
   ast.Visit(indexer)
   ast = ast.Visit(visitors.CanonicalOrderingVisitor())
+  # ClassType and FunctionType nodes compare by name only, so sorting by name
+  # gives the same order without calling Node.__lt__ for every comparison.
+  # The indexer's lists aren't used elsewhere, so sort them in place rather
+  # than copying them.
+  by_name = operator.attrgetter("name")
+  indexer.class_type_nodes.sort(key=by_name)
+  indexer.function_type_nodes.sort(key=by_name)
   return pytd_utils.SavePickle(SerializableAst(
-      ast, sorted(dependencies.items()),
-      sorted(late_dependencies.items()),
-      sorted(indexer.class_type_nodes),
-      sorted(indexer.function_type_nodes)), filename)
+      ast, sorted(indexer.dependencies.items()),
+      sorted(indexer.late_dependencies.items()),
+      indexer.class_type_nodes,
+      indexer.function_type_nodes,
+      indexer.has_self_refs), filename)
 
 
 def EnsureAstName(ast, module_name, fix=False):
@@ -107,9 +192,14 @@ def EnsureAstName(ast, module_name, fix=False):
   # module_name is the name from this run, raw_ast.name is the guessed name from
   # when the ast has been pickled.
   if fix and module_name != raw_ast.name:
-    ast = ast.Replace(class_type_nodes=None, function_type_nodes=None)
-    ast = ast.Replace(ast=raw_ast.Visit(
-        visitors.RenameModuleVisitor(raw_ast.name, module_name)))
+    if ast.has_self_refs:
+      ast = ast.Replace(class_type_nodes=None, function_type_nodes=None)
+      ast = ast.Replace(ast=raw_ast.Visit(
+          visitors.RenameModuleVisitor(raw_ast.name, module_name)))
+    else:
+      # Nothing inside the AST refers to the old name, so the node indices
+      # stay valid.
+      ast = ast.Replace(ast=raw_ast.Replace(name=module_name))
   else:
     assert module_name == raw_ast.name
   return ast
@@ -175,31 +265,29 @@ def _LookupClassReferences(serializable_ast, module_map, self_name):
   class_lookup = visitors.LookupExternalTypes(module_map, self_name=self_name)
   raw_ast = serializable_ast.ast
 
-  for node in (serializable_ast.class_type_nodes or ()):
-    try:
-      if node is not class_lookup.VisitClassType(node):
+  class_type_nodes = serializable_ast.class_type_nodes
+  function_type_nodes = serializable_ast.function_type_nodes
+  try:
+    if class_type_nodes is not None:
+      # Fill in the indexed nodes. Stop at the first node that doesn't resolve
+      # to itself, since the whole AST needs to be visited in that case anyway.
+      lookup_class = class_lookup.VisitClassType
+      if any(lookup_class(node) is not node for node in class_type_nodes):
         serializable_ast = serializable_ast.Replace(class_type_nodes=None)
-        break
-    except KeyError as e:
-      raise UnrestorableDependencyError(
-          "Unresolved class: %r." % utils.message(e))
-  for node in (serializable_ast.function_type_nodes or ()):
-    try:
-      # Use VisitNamedType, even though this is a FunctionType. We want to
-      # do a name lookup, to make sure this is still a function.
-      if not isinstance(class_lookup.VisitNamedType(node), pytd.FunctionType):
+    if function_type_nodes is not None:
+      # Use VisitNamedType, even though these are FunctionTypes. We want to
+      # do a name lookup, to make sure they are still functions. The full
+      # visit below doesn't look up FunctionTypes, so this always runs.
+      lookup_name = class_lookup.VisitNamedType
+      if not all(isinstance(lookup_name(node), pytd.FunctionType)
+                 for node in function_type_nodes):
         serializable_ast = serializable_ast.Replace(function_type_nodes=None)
-        break
-    except KeyError as e:
-      raise UnrestorableDependencyError(
-          "Unresolved class: %r." % utils.message(e))
-  if (serializable_ast.class_type_nodes is None or
-      serializable_ast.function_type_nodes is None):
-    try:
+    if (serializable_ast.class_type_nodes is None or
+        serializable_ast.function_type_nodes is None):
       raw_ast = raw_ast.Visit(class_lookup)
-    except KeyError as e:
-      raise UnrestorableDependencyError(
-          "Unresolved class: %r." % utils.message(e))
+  except KeyError as e:
+    raise UnrestorableDependencyError(
+        "Unresolved class: %r." % utils.message(e))
   serializable_ast = serializable_ast.Replace(ast=raw_ast)
   return serializable_ast
 
@@ -251,8 +339,7 @@ def PrepareForExport(module_name, python_version, ast, loader):
   # e.g. visitors.PrintVisitor._FormatContainerContents, which need to move to
   # their own visitors so they can be applied without printing.
   src = pytd_utils.Print(ast)
-  ast = parser.parse_string(src=src, name=module_name,
-                            python_version=python_version)
+  ast = _ParseForExport(src, module_name, python_version)
   ast = ast.Visit(visitors.LookupBuiltins(loader.builtins, full_names=False))
   ast = ast.Visit(visitors.ExpandCompatibleBuiltins(loader.builtins))
   ast = ast.Visit(visitors.LookupLocalTypes())
@@ -262,3 +349,30 @@ def PrepareForExport(module_name, python_version, ast, loader):
   ast = ast.Visit(visitors.ClassTypeToLateType(
       ignore=[module_name + ".", "__builtin__.", "typing."]))
   return ast
+
+
+def _ParseForExport(src, module_name, python_version):
+  """Parse src, reusing the result of an earlier call with the same arguments.
+
+  Only the parse is cached, not the result of PrepareForExport: that contains
+  ClassType nodes, which callers modify in place (e.g. StoreAst clears their
+  .cls pointers).
+
+  Args:
+    src: The pyi source as a string.
+    module_name: The module_name as a string for the returned ast.
+    python_version: A tuple of (major, minor) python version.
+
+  Returns:
+    A pytd.TypeDeclUnit.
+  """
+  key = (src, module_name, python_version)
+  ast = _parse_cache.pop(key, None)
+  if ast is None:
+    ast = parser.parse_string(src=src, name=module_name,
+                              python_version=python_version)
+    if len(_parse_cache) >= _PARSE_CACHE_SIZE:
+      _parse_cache.popitem(last=False)
+  # (Re)insert the key as the most recently used one.
+  _parse_cache[key] = ast
+  return ast
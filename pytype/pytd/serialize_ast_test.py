@@ -3,6 +3,7 @@ import pickle
 
 from pytype import file_utils
 from pytype import load_pytd
+from pytype.pytd import pytd
 from pytype.pytd import pytd_utils
 from pytype.pytd import serialize_ast
 from pytype.pytd import visitors
@@ -71,6 +72,51 @@ class SerializeAstTest(unittest.TestCase):
 
     self.assertEqual(len(indexer.class_type_nodes), 9)
 
+  def testStorePrepVisitor(self):
+    with file_utils.Tempdir() as d:
+      ast, _ = self._GetAst(temp_dir=d, module_name="foo.bar")
+    deps = visitors.CollectDependencies()
+    ast.Visit(deps)
+    indexer = serialize_ast._StorePrepVisitor()
+    ast.Visit(indexer)
+
+    self.assertEqual(indexer.dependencies, deps.dependencies)
+    self.assertEqual(indexer.late_dependencies, deps.late_dependencies)
+    self.assertEqual(len(indexer.class_type_nodes), 9)
+    self.assertTrue(all(n.cls is None for n in indexer.class_type_nodes))
+    self.assertTrue(indexer.has_self_refs)
+
+  def testUnrestorableFunctionTypeAfterChangedClassType(self):
+    ast = pytd_utils.CreateModule("foo", constants=(
+        pytd.Constant("foo.x", pytd.ClassType("other.A")),
+        pytd.Constant("foo.y", pytd.FunctionType("other.f"))))
+    other = pytd_utils.CreateModule("other", aliases=(
+        pytd.Alias("other.A", pytd.AnythingType()),))
+    serializable_ast = pickle.loads(serialize_ast.StoreAst(ast))
+    with self.assertRaisesRegexp(serialize_ast.UnrestorableDependencyError,
+                                 "No f in module other"):
+      serialize_ast.ProcessAst(serializable_ast, {"other": other})
+
+  def testStoreAstClearsClassPointers(self):
+    with file_utils.Tempdir() as d:
+      ast, _ = self._GetAst(temp_dir=d, module_name="foo.bar")
+    indexer = serialize_ast.FindClassAndFunctionTypesVisitor()
+    ast.Visit(indexer)
+    self.assertTrue(any(n.cls for n in indexer.class_type_nodes))
+    serializable_ast = pickle.loads(serialize_ast.StoreAst(ast))
+    self.assertEqual(len(serializable_ast.class_type_nodes), 9)
+    self.assertTrue(all(n.cls is None
+                        for n in serializable_ast.class_type_nodes))
+
+  def testLoadWithDifferentModuleNameWithoutSelfRefs(self):
+    ast = pytd_utils.CreateModule("foo.bar")
+    serializable_ast = pickle.loads(serialize_ast.StoreAst(ast))
+    self.assertFalse(serializable_ast.has_self_refs)
+    serializable_ast = serialize_ast.EnsureAstName(
+        serializable_ast, "foo.baz", fix=True)
+    self.assertEqual(serializable_ast.ast.name, "foo.baz")
+    self.assertIsNotNone(serializable_ast.class_type_nodes)
+
   def testNodeIndexVisitorUsage(self):
     """Confirms that the node index is used.
 
@@ -286,6 +332,24 @@ class SerializeAstTest(unittest.TestCase):
       signature, = f.type.function.signatures
       self.assertIsNotNone(signature.return_type.cls)
 
+  def testPrepareForExportTwice(self):
+    def ResolvedClassTypes(ast):
+      indexer = serialize_ast.FindClassAndFunctionTypesVisitor()
+      ast.Visit(indexer)
+      return [n.cls is not None for n in indexer.class_type_nodes]
+
+    with file_utils.Tempdir() as d:
+      ast, loader = self._GetAst(temp_dir=d, module_name="foo")
+      ast1 = serialize_ast.PrepareForExport(
+          "foo", self.PYTHON_VERSION, ast, loader)
+      resolved = ResolvedClassTypes(ast1)
+      self.assertTrue(any(resolved))
+      # StoreAst clears the .cls pointers of ast1 in place.
+      serialize_ast.StoreAst(ast1)
+      ast2 = serialize_ast.PrepareForExport(
+          "foo", self.PYTHON_VERSION, ast, loader)
+      self.assertEqual(ResolvedClassTypes(ast2), resolved)
+
 
 if __name__ == "__main__":
   unittest.main()